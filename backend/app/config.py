@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
+from functools import cached_property, lru_cache
 import os
 
 
@@ -14,6 +15,7 @@ class Settings(BaseSettings):
     azure_openai_api_key: Optional[str] = None
     azure_openai_api_version: str = "2024-02-15-preview"
     azure_openai_deployment_name: Optional[str] = None
+    azure_openai_embedding_deployment: Optional[str] = None
     
     # Application Configuration
     app_host: str = "0.0.0.0"
@@ -23,10 +25,27 @@ class Settings(BaseSettings):
     # Document Processing Configuration
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    max_parallel_extract: int = os.cpu_count() or 1
+    load_documents_threads: int = max(1, (os.cpu_count() or 2) - 1)
+    search_threads: int = os.cpu_count() or 1
+    # Search document text with the mini_rag_native library when it has been built
+    use_native: bool = True
+    native_lib_path: Optional[str] = None
     
     # File Upload Configuration
     max_file_size: int = 10485760  # 10MB
     allowed_extensions: str = "pdf,txt,docx,md"
+    use_io_uring: bool = False
+    
+    # Query Cache Configuration
+    semantic_cache_enabled: bool = True
+    semantic_cache_max_size: int = 256
+    semantic_cache_ttl_seconds: int = 3600
+    semantic_cache_threshold: float = 0.95
+    embedding_cache_size: int = 1000
+    # Approximate memory for document text kept between text searches
+    document_cache_max_bytes: int = 256 * 1024 * 1024
+    embedding_batch_size: int = 64
     
     # Data Paths
     data_dir: str = "/app/data"
@@ -37,15 +56,20 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = False
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Create directories if they don't exist
+    def ensure_dirs(self):
+        """Create data directories if they don't exist."""
         os.makedirs(self.uploads_dir, exist_ok=True)
         os.makedirs(self.vectorstore_dir, exist_ok=True)
 
-    @property
-    def allowed_extensions_list(self):
+    @cached_property
+    def allowed_extensions_list(self) -> List[str]:
         return [ext.strip() for ext in self.allowed_extensions.split(",")]
 
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Parse settings from the environment once per process."""
+    return Settings()
+
+
+settings = get_settings()
\ No newline at end of file
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 import os
@@ -9,12 +9,14 @@ import os
 from .routers import rag
 from .models.schemas import HealthResponse
 from .config import settings
+from .services.rag_service import RAGService
 
 # Create FastAPI app
 app = FastAPI(
     title="Mini-RAG API",
     description="A personal knowledge base management system using RAG (Retrieval-Augmented Generation)",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -76,8 +78,10 @@ async def startup_event():
     print(f"🤖 AI Model: {settings.azure_ai_model_name}")
     
     # Create directories if they don't exist
-    os.makedirs(settings.uploads_dir, exist_ok=True)
-    os.makedirs(settings.vectorstore_dir, exist_ok=True)
+    settings.ensure_dirs()
+    
+    # Share one RAG service (and its caches and clients) across all requests
+    app.state.rag_service = RAGService()
     
     print("✅ Mini-RAG API startup complete!")
 
@@ -86,6 +90,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown."""
     print("🛑 Mini-RAG API shutting down...")
+    # Don't lose document changes still waiting to be logged
+    await app.state.rag_service.document_store.flush_documents_log()
     print("✅ Cleanup complete!")
 
 
@@ -27,6 +27,7 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[dict]
     response_time: float
+    cached: bool = False
 
 
 class HealthResponse(BaseModel):
@@ -1,15 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
 from typing import List
-import aiofiles
 
 from ..models.schemas import QueryRequest, QueryResponse, DocumentResponse
 from ..services.rag_service import RAGService
 
 router = APIRouter()
 
-# Dependency to get RAG service instance
-async def get_rag_service():
-    return RAGService()
+# Dependency to get the shared RAG service instance created at startup
+async def get_rag_service(request: Request) -> RAGService:
+    return request.app.state.rag_service
 
 
 @router.post("/upload", response_model=DocumentResponse)
@@ -19,11 +18,8 @@ async def upload_document(
 ):
     """Upload and process a document."""
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Process document
-        result = await rag_service.upload_document(file_content, file.filename)
+        # Process document, streaming it to disk
+        result = await rag_service.upload_document(file)
         
         return result
         
@@ -31,6 +27,22 @@ async def upload_document(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/upload_batch", response_model=List[DocumentResponse])
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Upload and process several documents at once."""
+    try:
+        # Process documents, streaming them to disk
+        results = await rag_service.upload_documents(files)
+        
+        return results
+        
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/query", response_model=QueryResponse)
 async def query_documents(
     request: QueryRequest,
@@ -1,36 +1,66 @@
 import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
+import httpx
+import numpy as np
 import openai
 
 from ..config import settings
 
 
+_SYSTEM_MESSAGE = "You are Mini-RAG, a knowledge base assistant. Please answer questions in English only, based on the provided context. Be helpful, clear, and professional."
+
+_RAG_PROMPT_PREFIX = """You are Mini-RAG, a knowledge base assistant. Please answer the user's question strictly based on the provided context information.
+
+Important rules:
+1. Only use the provided context information to answer questions
+2. Do not use your pre-trained knowledge to answer
+3. If there is no relevant information in the context, clearly state "Based on the provided documents, I cannot find relevant information to answer this question"
+4. When answering, please indicate which source the information comes from
+5. Answer in English only
+6. Be helpful, clear, and professional in your responses
+7. You may quote code examples or technical content exactly as it appears in the documents
+
+Context information:
+"""
+
+_RAG_PROMPT_QUESTION = "\n\nUser question: "
+
+_RAG_PROMPT_SUFFIX = "\n\nPlease answer based on the above context information:"
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> Optional[openai.AzureOpenAI]:
+    """Create the process-wide Azure OpenAI client so all calls share one connection pool."""
+    try:
+        if settings.azure_openai_endpoint and settings.azure_openai_api_key:
+            return openai.AzureOpenAI(
+                api_key=settings.azure_openai_api_key,
+                api_version=settings.azure_openai_api_version,
+                azure_endpoint=settings.azure_openai_endpoint,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+                )
+            )
+        print("Warning: No Azure OpenAI credentials configured")
+        
+    except Exception as e:
+        print(f"Warning: Azure AI client initialization failed: {e}")
+        print("Using mock responses for development")
+    
+    return None
+
+
 class AzureAIService:
     """Handle Azure AI Foundry integration for RAG system."""
     
     def __init__(self):
-        self.client = None
-        self.openai_client = None
-        self._initialize_clients()
-    
-    def _initialize_clients(self):
-        """Initialize Azure AI clients."""
-        try:
-            # Initialize Azure OpenAI client
-            if settings.azure_openai_endpoint and settings.azure_openai_api_key:
-                self.openai_client = openai.AzureOpenAI(
-                    api_key=settings.azure_openai_api_key,
-                    api_version=settings.azure_openai_api_version,
-                    azure_endpoint=settings.azure_openai_endpoint
-                )
-            else:
-                print("Warning: No Azure OpenAI credentials configured")
-                self.openai_client = None
-                
-        except Exception as e:
-            print(f"Warning: Azure AI client initialization failed: {e}")
-            print("Using mock responses for development")
-            self.openai_client = None
+        self._embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._embedding_cache_lock = asyncio.Lock()
+        # Create the shared client up front so configuration problems show at startup
+        get_openai_client()
     
     async def generate_response(
         self, 
@@ -38,27 +68,84 @@ class AzureAIService:
         context_documents: List[Dict[str, Any]],
         max_tokens: int = 1000
     ) -> str:
-        """Generate response using Azure AI with RAG context."""
+        """Generate response using Azure AI with RAG context; raises if generation fails."""
         
         # Prepare context from retrieved documents
         context = self._prepare_context(context_documents)
         
         # If no context found, return a clear message
-        if not context or context.strip() == "":
+        if not context or context.isspace():
             return "Based on your uploaded documents, I cannot find relevant information to answer your question. Please ensure the relevant content has been uploaded to the knowledge base."
         
         # Create prompt with context
         prompt = self._create_rag_prompt(query, context)
         
+        if get_openai_client():
+            return await self._generate_with_openai(prompt, max_tokens)
+        else:
+            return self._mock_response(query, context)
+    
+    async def embed_text(self, text: str) -> Optional[np.ndarray]:
+        """Embed text with the configured embedding deployment, or None if unavailable."""
+        if not get_openai_client() or not settings.azure_openai_embedding_deployment:
+            return None
+        
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        async with self._embedding_cache_lock:
+            embedding = self._embedding_cache.get(key)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(key)
+                return embedding
+        
         try:
-            if self.openai_client:
-                return await self._generate_with_openai(prompt, max_tokens)
-            else:
-                return self._mock_response(query, context)
-                
+            response = await asyncio.to_thread(
+                get_openai_client().embeddings.create,
+                model=settings.azure_openai_embedding_deployment,
+                input=text
+            )
+            embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+            
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            return None
+        
+        async with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+            self._embedding_cache.move_to_end(key)
+            while len(self._embedding_cache) > settings.embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        
+        return embedding
+    
+    async def embed_batch(self, texts: List[str]) -> Optional[List[np.ndarray]]:
+        """Embed many texts with one API call per sub-batch, or None if unavailable."""
+        if not get_openai_client() or not settings.azure_openai_embedding_deployment:
+            return None
+        
+        if not texts:
+            return []
+        
+        # Identical chunks only need to be embedded once
+        unique_texts = list(dict.fromkeys(texts))
+        batch_size = max(1, settings.embedding_batch_size)
+        vectors: Dict[str, np.ndarray] = {}
+        
+        try:
+            for i in range(0, len(unique_texts), batch_size):
+                batch = unique_texts[i:i + batch_size]
+                response = await asyncio.to_thread(
+                    get_openai_client().embeddings.create,
+                    model=settings.azure_openai_embedding_deployment,
+                    input=batch
+                )
+                for item in response.data:
+                    vectors[batch[item.index]] = np.asarray(item.embedding, dtype=np.float32)
+            
         except Exception as e:
-            print(f"Error generating response: {e}")
-            return f"Sorry, an error occurred while generating the response: {str(e)}"
+            print(f"Error generating batch embeddings: {e}")
+            return None
+        
+        return [vectors[text] for text in texts]
     
     async def _generate_with_openai(self, prompt: str, max_tokens: int) -> str:
         """Generate response using Azure OpenAI."""
@@ -66,14 +153,11 @@ class AzureAIService:
             # Use deployment name if available, otherwise use model name
             model_name = settings.azure_openai_deployment_name or settings.azure_ai_model_name or "gpt-4"
             
-            # Set system message for English responses
-            system_message = "You are Mini-RAG, a knowledge base assistant. Please answer questions in English only, based on the provided context. Be helpful, clear, and professional."
-            
             response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
+                get_openai_client().chat.completions.create,
                 model=model_name,
                 messages=[
-                    {"role": "system", "content": system_message},
+                    {"role": "system", "content": _SYSTEM_MESSAGE},
                     {"role": "user", "content": prompt}
                 ],
                 max_tokens=max_tokens,
@@ -101,28 +185,10 @@ class AzureAIService:
     
     def _create_rag_prompt(self, query: str, context: str) -> str:
         """Create RAG prompt with query and context."""
-        if not context or context.strip() == "":
+        if not context or context.isspace():
             return ""  # No context available
             
-        prompt = f"""You are Mini-RAG, a knowledge base assistant. Please answer the user's question strictly based on the provided context information.
-
-Important rules:
-1. Only use the provided context information to answer questions
-2. Do not use your pre-trained knowledge to answer
-3. If there is no relevant information in the context, clearly state "Based on the provided documents, I cannot find relevant information to answer this question"
-4. When answering, please indicate which source the information comes from
-5. Answer in English only
-6. Be helpful, clear, and professional in your responses
-7. You may quote code examples or technical content exactly as it appears in the documents
-
-Context information:
-{context}
-
-User question: {query}
-
-Please answer based on the above context information:"""
-        
-        return prompt
+        return "".join([_RAG_PROMPT_PREFIX, context, _RAG_PROMPT_QUESTION, query, _RAG_PROMPT_SUFFIX])
     
     def _mock_response(self, query: str, context: str) -> str:
         """Generate mock response for development/testing."""
@@ -145,7 +211,7 @@ To enable real AI responses, please configure your Azure AI credentials in the .
 Summary:"""
 
         try:
-            if self.openai_client:
+            if get_openai_client():
                 return await self._generate_with_openai(prompt, max_length)
             else:
                 return f"Document summary (mock): This document contains approximately {len(text.split())} words."
@@ -1,38 +1,179 @@
 import os
+import re
 import uuid
-from typing import List, Optional
-from pathlib import Path
-import aiofiles
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from fastapi import UploadFile
 import pypdf
 import docx
-import markdown
-from bs4 import BeautifulSoup
 
+from . import uring_writer
 from ..config import settings
 
 
+# Uploads are copied to disk in pieces of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Markdown syntax stripped when extracting plain text, applied in this order
+_MD_FENCE_RE = re.compile(r"^[ \t]*(?:```|~~~).*$", re.MULTILINE)
+_MD_RULE_RE = re.compile(r"^[ \t]*(?:[-*_][ \t]*){3,}$", re.MULTILINE)
+_MD_REF_DEF_RE = re.compile(r"^[ \t]*\[[^\]]+\]:[ \t]*\S+.*$", re.MULTILINE)
+_MD_BLOCK_PREFIX_RE = re.compile(r"^[ \t]*(?:>[ \t]?)*(?:#{1,6}[ \t]+|[-*+][ \t]+|\d+[.)][ \t]+)?", re.MULTILINE)
+_MD_HEADING_TAIL_RE = re.compile(r"[ \t]+#+[ \t]*$", re.MULTILINE)
+_MD_IMAGE_LINK_RE = re.compile(r"!?\[([^\]]*)\](?:\([^)]*\)|\[[^\]]*\])")
+_MD_EMPHASIS_RE = re.compile(r"(\*{1,3}|(?<!\w)_{1,3})(?=\S)(.+?)(?<=\S)\1(?!\w)")
+_MD_INLINE_CODE_RE = re.compile(r"`+([^`]*)`+")
+_MD_HTML_TAG_RE = re.compile(r"</?[A-Za-z][^>]*>")
+_MD_BLANK_LINES_RE = re.compile(r"\n[ \t]*(?:\n[ \t]*)+")
+
+# PDF parsing is CPU-bound pure Python, so it runs in worker processes
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Create the PDF worker pool on first use."""
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+    return _pdf_pool
+
+
+def _extract_from_pdf(file_path: str) -> str:
+    """Extract text from PDF file."""
+    with open(file_path, "rb") as file:
+        pdf_reader = pypdf.PdfReader(file)
+        parts = [page.extract_text() for page in pdf_reader.pages]
+    return "\n".join(parts).strip()
+
+
+def _extract_from_docx(file_path: str) -> str:
+    """Extract text from DOCX file."""
+    doc = docx.Document(file_path)
+    parts = [paragraph.text for paragraph in doc.paragraphs]
+    return "\n".join(parts).strip()
+
+
+def _extract_from_txt(file_path: str) -> str:
+    """Extract text from TXT file."""
+    with open(file_path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def _extract_from_markdown(file_path: str) -> str:
+    """Extract text from Markdown file."""
+    with open(file_path, "r", encoding="utf-8") as file:
+        text = file.read()
+    
+    # Strip the syntax directly instead of rendering and re-parsing HTML
+    text = _MD_FENCE_RE.sub("", text)
+    text = _MD_RULE_RE.sub("", text)
+    text = _MD_REF_DEF_RE.sub("", text)
+    text = _MD_BLOCK_PREFIX_RE.sub("", text)
+    text = _MD_HEADING_TAIL_RE.sub("", text)
+    text = _MD_IMAGE_LINK_RE.sub(r"\1", text)
+    text = _MD_INLINE_CODE_RE.sub(r"\1", text)
+    text = _MD_EMPHASIS_RE.sub(r"\2", text)
+    text = _MD_HTML_TAG_RE.sub("", text)
+    return _MD_BLANK_LINES_RE.sub("\n", text).strip()
+
+
+_EXTRACTORS = {
+    ".pdf": _extract_from_pdf,
+    ".docx": _extract_from_docx,
+    ".txt": _extract_from_txt,
+    ".md": _extract_from_markdown,
+}
+
+
+def extract_text_sync(file_path: str) -> str:
+    """Extract text from various file formats."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    extractor = _EXTRACTORS.get(file_extension)
+    
+    try:
+        if extractor is None:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+        return extractor(file_path)
+    except Exception as e:
+        raise Exception(f"Error extracting text from {file_path}: {str(e)}")
+
+
+def split_text_into_chunks(text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+    """Split text into chunks for vector embedding."""
+    chunk_size = chunk_size or settings.chunk_size
+    chunk_overlap = chunk_overlap or settings.chunk_overlap
+    
+    if len(text) <= chunk_size:
+        return [text]
+    
+    # Find all chunk boundaries first, then slice the text once per chunk
+    text_length = len(text)
+    bounds = []
+    start = 0
+    
+    while start < text_length:
+        end = start + chunk_size
+    
+        # Try to break at sentence boundary
+        if end < text_length:
+            # Find the last period in the second half of the chunk; earlier
+            # periods would make the chunk too short, so don't scan for them
+            last_period = text.rfind(".", start + chunk_size // 2 + 1, end)
+            if last_period != -1:
+                end = last_period + 1
+    
+        bounds.append((start, end))
+    
+        start = end - chunk_overlap
+        if start >= text_length:
+            break
+    
+    # str.strip() returns the slice itself when there is nothing to strip
+    chunks = [chunk for chunk in (text[a:b].strip() for a, b in bounds) if chunk]
+    
+    return chunks
+
+
 class DocumentProcessor:
     """Handle document processing and text extraction."""
     
     def __init__(self):
         self.allowed_extensions = settings.allowed_extensions_list
+        # Bound concurrent extractions so parallel uploads don't thrash the disk
+        self._extract_semaphore = asyncio.Semaphore(max(1, settings.max_parallel_extract))
         
-    async def save_file(self, file_content: bytes, filename: str) -> str:
-        """Save uploaded file and return file path."""
-        # Generate unique filename
+    def _new_file_path(self, filename: str) -> str:
+        """Return a unique path in the uploads directory for the file."""
         file_id = str(uuid.uuid4())
-        file_extension = Path(filename).suffix.lower()
         new_filename = f"{file_id}_{filename}"
-        file_path = os.path.join(settings.uploads_dir, new_filename)
+        return os.path.join(settings.uploads_dir, new_filename)
+    
+    async def save_upload(self, upload: UploadFile, filename: str) -> Tuple[str, int, str]:
+        """Stream an upload to disk and return its path, size and SHA-256 hex digest."""
+        file_path = self._new_file_path(filename)
+        hasher = hashlib.sha256()
+        file_size = 0
         
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(file_content)
-            
-        return file_path
+        try:
+            async with uring_writer.open_for_write(file_path) as f:
+                while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    if file_size > settings.max_file_size:
+                        raise ValueError(f"File size exceeds maximum allowed size {settings.max_file_size}")
+                    hasher.update(chunk)
+                    await f.write(chunk)
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        
+        return file_path, file_size, hasher.hexdigest()
     
     def validate_file(self, filename: str, file_size: int) -> tuple[bool, str]:
         """Validate file extension and size."""
-        file_extension = Path(filename).suffix.lower().lstrip(".")
+        file_extension = os.path.splitext(filename)[1].lower().lstrip(".")
         
         if file_extension not in self.allowed_extensions:
             return False, f"File type .{file_extension} not allowed. Allowed types: {', '.join(self.allowed_extensions)}"
@@ -42,82 +183,20 @@ class DocumentProcessor:
         
         return True, "Valid file"
     
-    def extract_text_from_file(self, file_path: str) -> str:
-        """Extract text from various file formats."""
-        file_extension = Path(file_path).suffix.lower()
+    async def extract_text_from_file(self, file_path: str) -> str:
+        """Extract text from a file without blocking the event loop."""
+        file_extension = os.path.splitext(file_path)[1].lower()
         
-        try:
+        async with self._extract_semaphore:
             if file_extension == ".pdf":
-                return self._extract_from_pdf(file_path)
-            elif file_extension == ".docx":
-                return self._extract_from_docx(file_path)
-            elif file_extension == ".txt":
-                return self._extract_from_txt(file_path)
-            elif file_extension == ".md":
-                return self._extract_from_markdown(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
-        except Exception as e:
-            raise Exception(f"Error extracting text from {file_path}: {str(e)}")
-    
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file."""
-        text = ""
-        with open(file_path, "rb") as file:
-            pdf_reader = pypdf.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text.strip()
-    
-    def _extract_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file."""
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text.strip()
-    
-    def _extract_from_txt(self, file_path: str) -> str:
-        """Extract text from TXT file."""
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
-    
-    def _extract_from_markdown(self, file_path: str) -> str:
-        """Extract text from Markdown file."""
-        with open(file_path, "r", encoding="utf-8") as file:
-            md_content = file.read()
-            # Convert markdown to HTML and then extract text
-            html = markdown.markdown(md_content)
-            soup = BeautifulSoup(html, "html.parser")
-            return soup.get_text()
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(_get_pdf_pool(), _extract_from_pdf, file_path)
+                except Exception as e:
+                    raise Exception(f"Error extracting text from {file_path}: {str(e)}")
+            
+            return await asyncio.to_thread(extract_text_sync, file_path)
     
     def split_text_into_chunks(self, text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
         """Split text into chunks for vector embedding."""
-        chunk_size = chunk_size or settings.chunk_size
-        chunk_overlap = chunk_overlap or settings.chunk_overlap
-        
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Find the last period within the chunk
-                last_period = text.rfind(".", start, end)
-                if last_period != -1 and last_period > start + chunk_size // 2:
-                    end = last_period + 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - chunk_overlap
-            if start >= len(text):
-                break
-        
-        return chunks
\ No newline at end of file
+        return split_text_into_chunks(text, chunk_size, chunk_overlap)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import os
+import sys
+import ctypes
+from typing import Optional, Sequence, Set, Tuple
+
+from ..config import settings
+
+
+# Where `cargo build --release` puts the library when no path is configured
+_LIB_NAMES = {"win32": "mini_rag_native.dll", "darwin": "libmini_rag_native.dylib"}
+_DEFAULT_LIB_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "mini_rag_native", "target", "release",
+    _LIB_NAMES.get(sys.platform, "libmini_rag_native.so")
+)
+
+# Borrows a str's UTF-8 form: CPython returns ASCII strings' own buffer and
+# caches an encoded copy on other strings, so repeated calls don't re-encode
+_as_utf8 = ctypes.pythonapi.PyUnicode_AsUTF8AndSize
+_as_utf8.argtypes = [ctypes.py_object, ctypes.POINTER(ctypes.c_ssize_t)]
+_as_utf8.restype = ctypes.c_void_p
+
+
+def _load_library() -> Optional[ctypes.CDLL]:
+    """Load the native library, or return None to use the pure Python code paths."""
+    if not settings.use_native:
+        return None
+    lib_path = settings.native_lib_path or _DEFAULT_LIB_PATH
+    if not os.path.exists(lib_path):
+        return None
+    try:
+        lib = ctypes.CDLL(lib_path)
+    except OSError as e:
+        print(f"Warning: could not load native library {lib_path}: {e}")
+        return None
+
+    lib.mrn_find_patterns.argtypes = [
+        ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_size_t),
+        ctypes.c_size_t, ctypes.c_char_p, ctypes.c_char_p
+    ]
+    lib.mrn_find_patterns.restype = ctypes.c_size_t
+    return lib
+
+
+# ctypes.CDLL releases the GIL during each call, so worker threads calling
+# into the library run in parallel
+_lib = _load_library()
+
+
+def is_enabled() -> bool:
+    """Whether the native library is configured and loaded."""
+    return _lib is not None
+
+
+def _utf8(text: str) -> Tuple[int, int]:
+    size = ctypes.c_ssize_t()
+    address = _as_utf8(text, ctypes.byref(size))
+    return address, size.value
+
+
+class PatternSet:
+    """A fixed set of search patterns that can be looked up in many documents."""
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._index = {pattern: i for i, pattern in enumerate(self.patterns)}
+        encoded = [pattern.encode("utf-8") for pattern in self.patterns]
+        self._encoded = (ctypes.c_char_p * len(encoded))(*encoded)
+        self._lens = (ctypes.c_size_t * len(encoded))(*map(len, encoded))
+
+    def find(self, text: str, wanted: Sequence[str]) -> Set[str]:
+        """Return which of the wanted patterns occur in text."""
+        flags = bytearray(len(self.patterns))
+        for pattern in wanted:
+            flags[self._index[pattern]] = 1
+        found = ctypes.create_string_buffer(len(self.patterns))
+        address, size = _utf8(text)
+        _lib.mrn_find_patterns(
+            address, size, self._encoded, self._lens, len(self.patterns), bytes(flags), found
+        )
+        return {pattern for pattern, hit in zip(self.patterns, found.raw) if hit}
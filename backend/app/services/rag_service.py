@@ -1,12 +1,17 @@
 import os
 import uuid
 import time
+import asyncio
+import multiprocessing
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from fastapi import UploadFile
 
-from .document_processor import DocumentProcessor
+from .document_processor import DocumentProcessor, extract_text_sync
 from .simple_document_store import SimpleDocumentStore
 from .azure_ai import AzureAIService
+from .semantic_cache import SemanticCache
+from ..config import settings
 from ..models.schemas import QueryRequest, QueryResponse, DocumentResponse
 
 
@@ -17,56 +22,37 @@ class RAGService:
         self.document_processor = DocumentProcessor()
         self.document_store = SimpleDocumentStore()
         self.azure_ai = AzureAIService()
+        self.query_cache = SemanticCache(
+            max_size=settings.semantic_cache_max_size if settings.semantic_cache_enabled else 0,
+            ttl_seconds=settings.semantic_cache_ttl_seconds,
+            threshold=settings.semantic_cache_threshold
+        )
     
-    async def upload_document(self, file_content: bytes, filename: str) -> DocumentResponse:
+    async def upload_document(self, file: UploadFile) -> DocumentResponse:
         """Process and store a document in the RAG system."""
         start_time = time.time()
+        filename = file.filename
         
         try:
-            # Validate file
-            is_valid, message = self.document_processor.validate_file(filename, len(file_content))
+            # Validate file type, and size when the client declared it
+            is_valid, message = self.document_processor.validate_file(filename, file.size or 0)
             if not is_valid:
                 raise ValueError(message)
             
-            # Save file
-            file_path = await self.document_processor.save_file(file_content, filename)
+            # Stream file to disk
+            file_path, file_size, content_hash = await self.document_processor.save_upload(file, filename)
             
-            # Extract text
-            text_content = self.document_processor.extract_text_from_file(file_path)
-            
-            # Generate document ID and metadata
-            document_id = str(uuid.uuid4())
-            metadata = {
-                "source": filename,
-                "file_path": file_path,
-                "upload_time": datetime.now().isoformat(),
-                "file_size": len(file_content)
-            }
+            # Identical content was already ingested, so skip extraction and indexing
+            existing = self.document_store.find_by_hash(content_hash)
+            if existing is not None:
+                os.remove(file_path)
+                return self._deduped_response(existing, file_size, start_time)
             
-            # Add to document store
-            success = await self.document_store.add_document(
-                document_id, filename, text_content, metadata
-            )
+            # Extract text
+            text_content = await self.document_processor.extract_text_from_file(file_path)
             
-            if not success:
-                raise Exception("Failed to store document")
-            
-            # Generate document summary
-            summary = await self.azure_ai.summarize_document(text_content)
-            
-            processing_time = time.time() - start_time
-            
-            return DocumentResponse(
-                id=document_id,
-                filename=filename,
-                content_preview=text_content[:500] + "..." if len(text_content) > 500 else text_content,
-                upload_time=datetime.now(),
-                metadata={
-                    "processing_time": processing_time,
-                    "summary": summary,
-                    "file_size": len(file_content),
-                    "storage_type": "markdown_file"
-                }
+            return await self._store_document(
+                filename, file_path, file_size, content_hash, text_content, start_time
             )
             
         except Exception as e:
@@ -78,22 +64,215 @@ class RAGService:
                     pass
             raise Exception(f"Error processing document: {str(e)}")
     
+    async def upload_documents(self, files: List[UploadFile]) -> List[DocumentResponse]:
+        """Process and store several documents, extracting their text in parallel."""
+        start_time = time.time()
+        file_paths: List[str] = []
+        
+        try:
+            # Validate every file before doing any work
+            for file in files:
+                is_valid, message = self.document_processor.validate_file(file.filename, file.size or 0)
+                if not is_valid:
+                    raise ValueError(f"{file.filename}: {message}")
+            
+            # Stream files to disk
+            saved = await asyncio.gather(
+                *(self.document_processor.save_upload(file, file.filename) for file in files),
+                return_exceptions=True
+            )
+            file_paths = [result[0] for result in saved if not isinstance(result, BaseException)]
+            for result in saved:
+                if isinstance(result, BaseException):
+                    raise result
+            
+            # Answer duplicates of already ingested files from the store, and
+            # duplicates within the batch from their first copy
+            responses: List[Optional[DocumentResponse]] = [None] * len(files)
+            pending = []
+            batch_duplicates = []
+            first_by_hash: Dict[str, int] = {}
+            for i, (file_path, file_size, content_hash) in enumerate(saved):
+                existing = self.document_store.find_by_hash(content_hash)
+                if existing is not None:
+                    os.remove(file_path)
+                    responses[i] = self._deduped_response(existing, file_size, start_time)
+                elif content_hash in first_by_hash:
+                    os.remove(file_path)
+                    batch_duplicates.append(i)
+                else:
+                    first_by_hash[content_hash] = i
+                    pending.append(i)
+            file_paths = [saved[i][0] for i in pending]
+            
+            # Extract text in worker processes
+            texts = await asyncio.to_thread(self._extract_texts_in_pool, file_paths)
+            
+            stored = await asyncio.gather(*(
+                self._store_document(files[i].filename, *saved[i], text_content, start_time)
+                for i, text_content in zip(pending, texts)
+            ), return_exceptions=True)
+            
+            # The batch succeeds or fails as a whole, so roll back the stored siblings of a failure
+            failures = [result for result in stored if isinstance(result, BaseException)]
+            if failures:
+                for result in stored:
+                    if not isinstance(result, BaseException):
+                        await self.delete_document(result.id)
+                raise failures[0]
+            
+            for i, response in zip(pending, stored):
+                responses[i] = response
+            for i in batch_duplicates:
+                file_size, content_hash = saved[i][1:]
+                existing = self.document_store.find_by_hash(content_hash)
+                responses[i] = self._deduped_response(existing, file_size, start_time)
+            
+            return responses
+            
+        except Exception as e:
+            # Clean up files that were saved but not processed
+            for file_path in file_paths:
+                try:
+                    os.remove(file_path)
+                except:
+                    pass
+            raise Exception(f"Error processing documents: {str(e)}")
+    
+    def _extract_texts_in_pool(self, file_paths: List[str]) -> List[str]:
+        """Extract text from many files with a per-call process pool."""
+        if not file_paths:
+            return []
+        
+        # A fresh pool per batch avoids forking a long-lived pool that holds client state
+        processes = max(1, min(settings.load_documents_threads, len(file_paths)))
+        with multiprocessing.Pool(processes) as pool:
+            return pool.map(extract_text_sync, file_paths)
+    
+    async def _store_document(
+        self,
+        filename: str,
+        file_path: str,
+        file_size: int,
+        content_hash: str,
+        text_content: str,
+        start_time: float
+    ) -> DocumentResponse:
+        """Index, summarize and describe a document whose text has been extracted."""
+        # Generate document ID and metadata
+        document_id = str(uuid.uuid4())
+        metadata = {
+            "source": filename,
+            "file_path": file_path,
+            "upload_time": datetime.now().isoformat(),
+            "file_size": file_size,
+            "content_hash": content_hash
+        }
+        
+        # Index the document and summarize it concurrently
+        success, summary = await asyncio.gather(
+            self._index_document(document_id, filename, text_content, metadata),
+            self.azure_ai.summarize_document(text_content)
+        )
+        
+        if not success:
+            raise Exception("Failed to store document")
+        
+        await self.query_cache.invalidate()
+        
+        processing_time = time.time() - start_time
+        
+        return DocumentResponse(
+            id=document_id,
+            filename=filename,
+            content_preview=text_content[:500] + "..." if len(text_content) > 500 else text_content,
+            upload_time=datetime.now(),
+            metadata={
+                "processing_time": processing_time,
+                "summary": summary,
+                "file_size": file_size,
+                "storage_type": "markdown_file"
+            }
+        )
+    
+    def _deduped_response(
+        self, existing: Dict[str, Any], file_size: int, start_time: float
+    ) -> DocumentResponse:
+        """Describe an already stored document that an upload duplicated."""
+        doc_info = existing["metadata"]
+        
+        return DocumentResponse(
+            id=existing["id"],
+            filename=doc_info["filename"],
+            content_preview=existing["content"],
+            upload_time=datetime.fromisoformat(doc_info["upload_time"]),
+            metadata={
+                "processing_time": time.time() - start_time,
+                "file_size": file_size,
+                "storage_type": "markdown_file",
+                "deduped": True
+            }
+        )
+    
+    async def _index_document(
+        self, document_id: str, filename: str, text_content: str, metadata: Dict[str, Any]
+    ) -> bool:
+        """Chunk, embed and store a document."""
+        # Chunk once and embed all chunks in batched API calls
+        chunks = self.document_processor.split_text_into_chunks(text_content)
+        embeddings = await self.azure_ai.embed_batch(chunks)
+        
+        return await self.document_store.add_document(
+            document_id, filename, text_content, metadata,
+            chunks=chunks, embeddings=embeddings
+        )
+    
     async def query_documents(self, request: QueryRequest) -> QueryResponse:
         """Query the RAG system and generate a response."""
         start_time = time.time()
         
         try:
-            # Perform simple text search
+            # Schedule the query embedding, but check for an exact cache hit first;
+            # on a hit the task is cancelled before it ever calls the API
+            embed_task = asyncio.create_task(self.azure_ai.embed_text(request.query))
+            generation = self.query_cache.generation
+            # Both settings change which documents are retrieved, so answers are only shared within them
+            cache_scope = f"{request.max_results}:{request.similarity_threshold}"
+            
+            cached_response = await self.query_cache.get(request.query, cache_scope)
+            if cached_response is None:
+                query_embedding = await embed_task
+                cached_response = await self.query_cache.get(request.query, cache_scope, query_embedding)
+            else:
+                embed_task.cancel()
+            
+            # Answer repeated or near-identical questions from the cache
+            if cached_response is not None:
+                return cached_response.model_copy(update={
+                    "query": request.query,
+                    "response_time": time.time() - start_time,
+                    "cached": True
+                })
+            
+            # Retrieve by embedding similarity, falling back to text search
             relevant_docs = await self.document_store.search_documents(
                 query=request.query,
-                max_results=request.max_results
+                max_results=request.max_results,
+                query_embedding=query_embedding,
+                similarity_threshold=request.similarity_threshold
             )
             
-            # Generate AI response
-            answer = await self.azure_ai.generate_response(
-                query=request.query,
-                context_documents=relevant_docs
-            )
+            # Generate AI response; a failed generation is answered but never cached
+            try:
+                answer = await self.azure_ai.generate_response(
+                    query=request.query,
+                    context_documents=relevant_docs
+                )
+                generated = True
+            except Exception as e:
+                print(f"Error generating response: {e}")
+                answer = f"Sorry, an error occurred while generating the response: {str(e)}"
+                generated = False
             
             # Prepare source information
             sources = []
@@ -108,12 +287,18 @@ class RAGService:
             
             response_time = time.time() - start_time
             
-            return QueryResponse(
+            response = QueryResponse(
                 query=request.query,
                 answer=answer,
                 sources=sources,
                 response_time=response_time
             )
+            if generated:
+                await self.query_cache.put(
+                    request.query, cache_scope, response, query_embedding, generation=generation
+                )
+            
+            return response
             
         except Exception as e:
             raise Exception(f"Error querying documents: {str(e)}")
@@ -156,7 +341,10 @@ class RAGService:
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document."""
         try:
-            return await self.document_store.delete_document(document_id)
+            deleted = await self.document_store.delete_document(document_id)
+            if deleted:
+                await self.query_cache.invalidate()
+            return deleted
             
         except Exception as e:
             print(f"Error deleting document {document_id}: {str(e)}")
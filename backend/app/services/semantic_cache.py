@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from ..models.schemas import QueryResponse
+
+
+class _CacheEntry(NamedTuple):
+    scope: str
+    embedding: Optional[np.ndarray]
+    response: QueryResponse
+    timestamp: float
+
+
+class SemanticCache:
+    """LRU cache of query answers, matched by exact query text or embedding similarity."""
+
+    def __init__(self, max_size: int, ttl_seconds: float, threshold: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.generation = 0
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+        # Stacked (N, d) float32 matrix of normalized embeddings, rebuilt lazily
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+    @staticmethod
+    def _make_key(query: str, scope: str) -> str:
+        """Normalize case and whitespace so trivially different queries share an entry."""
+        return f"{scope}\x00{' '.join(query.lower().split())}"
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+        norm = np.linalg.norm(embedding)
+        if not norm:
+            return None
+        return (embedding / norm).astype(np.float32)
+
+    def _is_expired(self, entry: _CacheEntry, now: float) -> bool:
+        return now - entry.timestamp > self.ttl_seconds
+
+    def _evict(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def _build_matrix(self):
+        """Stack the cached embeddings so a lookup is a single matmul."""
+        self._matrix_keys = [key for key, entry in self._entries.items() if entry.embedding is not None]
+        if self._matrix_keys:
+            self._matrix = np.vstack([self._entries[key].embedding for key in self._matrix_keys])
+        else:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    async def get(self, query: str, scope: str, embedding: Optional[np.ndarray] = None) -> Optional[QueryResponse]:
+        """Return a cached response for the query, or None on a miss."""
+        now = time.time()
+        key = self._make_key(query, scope)
+
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._is_expired(entry, now):
+                    self._entries.move_to_end(key)
+                    return entry.response
+                self._evict(key)
+
+            if embedding is None:
+                return None
+            query_vec = self._normalize(embedding)
+            if query_vec is None:
+                return None
+
+            if self._matrix is None:
+                self._build_matrix()
+            if not self._matrix_keys or self._matrix.shape[1] != query_vec.shape[0]:
+                return None
+
+            scores = self._matrix @ query_vec
+            for idx in np.argsort(-scores):
+                if scores[idx] < self.threshold:
+                    break
+                match_key = self._matrix_keys[idx]
+                entry = self._entries[match_key]
+                if entry.scope != scope:
+                    continue
+                if self._is_expired(entry, now):
+                    self._evict(match_key)
+                    return None
+                self._entries.move_to_end(match_key)
+                return entry.response
+
+            return None
+
+    async def put(
+        self,
+        query: str,
+        scope: str,
+        response: QueryResponse,
+        embedding: Optional[np.ndarray] = None,
+        generation: Optional[int] = None
+    ):
+        """Store a response, unless the documents changed while it was being generated."""
+        if self.max_size <= 0:
+            return
+
+        async with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            key = self._make_key(query, scope)
+            if key in self._entries:
+                del self._entries[key]
+            vector = self._normalize(embedding) if embedding is not None else None
+            self._entries[key] = _CacheEntry(scope, vector, response, time.time())
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    async def invalidate(self):
+        """Drop every cached answer; called whenever the document set changes."""
+        async with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._matrix = None
@@ -1,57 +1,486 @@
 import os
-import json
+import re
+import sys
+import mmap
 import uuid
-from typing import List, Dict, Any, Optional
+import sqlite3
+import asyncio
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import zip_longest
+from typing import List, Dict, Any, NamedTuple, Optional, Set, Tuple
 from datetime import datetime
+import ahocorasick
+import numpy as np
+import orjson
 
+from . import native, uring_writer
+from .document_processor import split_text_into_chunks
 from ..config import settings
 
 
+# Normalized embeddings are kept in memory as int8 components scaled by this
+QUANT_SCALE = 127
+
+# Rows of the int8 matrix widened to float32 at a time when scoring a query
+SCORE_BLOCK_ROWS = 8192
+
+# The documents log is folded into the snapshot once it grows past both of these
+LOG_COMPACT_MIN_BYTES = 1 << 20
+LOG_COMPACT_RATIO = 2
+
+# Changes made within this many seconds of each other share one log write and fsync
+LOG_FLUSH_DELAY = 0.1
+# Seconds before retrying a log write that failed
+LOG_RETRY_DELAY = 1.0
+
+# Buffer size for reading markdown files and the documents index, instead of the default 8 KiB
+FILE_BUFFER_SIZE = 1 << 20
+
+
+# Common stop words to ignore in search queries
+_STOP_WORDS = frozenset({
+    '的', '是', '在', '有', '和', '与', '或', '但', '然后', '如何', '什么', '怎么', '怎样',
+    'how', 'to', 'what', 'is', 'are', 'the', 'a', 'an', 'and', 'or', 'but', 'then'
+})
+_KEYWORD_STRIP_CHARS = '.,!?;:()[]{}"\'-'
+
+_NEWLINE_RE = re.compile(r"\n")
+_PARAGRAPH_RE = re.compile(r"\n\n")
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class _DocumentCache:
+    """LRU cache of loaded documents, bounded by their approximate size in memory."""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Tuple[str, str, List[int]], int]]" = OrderedDict()
+        # Search workers read and fill the cache from several threads
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def entry_size(loaded: Tuple[str, str, List[int]]) -> int:
+        content, content_lower, line_starts = loaded
+        size = sys.getsizeof(content) + sys.getsizeof(content_lower) + sys.getsizeof(line_starts)
+        # Offsets past 256 are separate int objects
+        size += 28 * len(line_starts)
+        # Native search attaches a UTF-8 copy to non-ASCII text
+        if native.is_enabled() and not content_lower.isascii():
+            size += 3 * len(content_lower)
+        return size
+    
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._entries
+    
+    def get(self, doc_id: str) -> Optional[Tuple[str, str, List[int]]]:
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(doc_id)
+            return entry[0]
+    
+    def put(self, doc_id: str, loaded: Tuple[str, str, List[int]]):
+        size = self.entry_size(loaded)
+        with self._lock:
+            self._pop(doc_id)
+            if size > self.max_bytes:
+                return
+            self._entries[doc_id] = (loaded, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+    
+    def pop(self, doc_id: str):
+        with self._lock:
+            self._pop(doc_id)
+    
+    def _pop(self, doc_id: str):
+        entry = self._entries.pop(doc_id, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+
+class _TextQuery(NamedTuple):
+    """A parsed text search query, shared by the per-document match workers."""
+    query_lower: str
+    keywords: List[str]
+    keyword_counts: Counter
+    patterns: Set[str]
+    automaton: Optional["ahocorasick.Automaton"]
+    # Per pattern: documents containing it as a whole token, and documents
+    # that may contain it at all (None if any may)
+    certain: Dict[str, Set[str]]
+    possible: Dict[str, Optional[Set[str]]]
+    # Patterns shortest first, each with the other patterns it contains
+    scan_order: List[Tuple[str, Tuple[str, ...]]]
+    # Native substring search for the patterns, if the library is loaded
+    matcher: Optional["native.PatternSet"]
+    
+    @property
+    def phrase_everywhere(self) -> bool:
+        # Like the `in` operator, an empty phrase is found in every document and line
+        return not self.query_lower
+    
+    @property
+    def phrase_fits_line(self) -> bool:
+        return '\n' not in self.query_lower
+    
+    @property
+    def few_keywords(self) -> bool:
+        return len(self.keywords) <= 2
+
+
+def _scan_order(patterns: Set[str]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """Order patterns so a document missing a pattern is never scanned for one that contains it."""
+    ordered = sorted(patterns, key=lambda pattern: (len(pattern), pattern))
+    return [
+        (pattern, tuple(sub for sub in ordered[:i] if sub in pattern))
+        for i, pattern in enumerate(ordered)
+    ]
+
+
+@lru_cache(maxsize=128)
+def _build_automaton(patterns: Tuple[str, ...]) -> "ahocorasick.Automaton":
+    """Build an Aho-Corasick automaton that finds all the patterns in one pass."""
+    automaton = ahocorasick.Automaton()
+    for pattern in patterns:
+        automaton.add_word(pattern, pattern)
+    automaton.make_automaton()
+    return automaton
+
+
+@lru_cache(maxsize=128)
+def _build_matcher(patterns: Tuple[str, ...]) -> "native.PatternSet":
+    """Prepare the patterns for native substring search."""
+    return native.PatternSet(patterns)
+
+
 class SimpleDocumentStore:
-    """Simple file-based document storage without vector embeddings."""
+    """Simple file-based document storage with optional chunk embeddings."""
     
     def __init__(self):
         self.documents_file = os.path.join(settings.data_dir, "documents.json")
+        self.documents_log_file = os.path.join(settings.data_dir, "documents.jsonl")
+        self.inverted_file = os.path.join(settings.data_dir, "inverted_index.db")
         self.markdown_dir = os.path.join(settings.data_dir, "markdown")
+        self.vectors_dir = settings.vectorstore_dir
         os.makedirs(self.markdown_dir, exist_ok=True)
+        os.makedirs(self.vectors_dir, exist_ok=True)
+        
+        # Names of the markdown files on disk, kept in sync by add and delete so
+        # reads don't need an existence check per document
+        self._known_files: Set[str] = {entry.name for entry in os.scandir(self.markdown_dir) if entry.is_file()}
         
-        # Load existing documents index
+        # Serializes index mutations now that one store is shared by all requests
+        self._lock = asyncio.Lock()
+        
+        # Load existing documents index: a snapshot plus an append-only log of
+        # later changes, so a mutation only writes one record
         self.documents_index = self._load_documents_index()
+        self._snapshot_size = os.path.getsize(self.documents_file) if os.path.exists(self.documents_file) else 0
+        self._log = open(self.documents_log_file, 'ab', buffering=0)
+        if self._log.tell():
+            self._compact_documents_log()
+        
+        # Serialized log records waiting for the next flush
+        self._pending_log: List[bytes] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        # Map content hashes to document IDs to detect duplicate uploads
+        self._hash_index: Dict[str, str] = {}
+        for doc_id, doc_info in self.documents_index.items():
+            content_hash = doc_info.get("metadata", {}).get("content_hash")
+            if content_hash:
+                self._hash_index[content_hash] = doc_id
+        
+        # Document ID -> (content, lowercased content, line start offsets) for
+        # recently searched documents; the store is the only writer of markdown
+        # files, so entries stay valid until the document is deleted
+        self._doc_cache = _DocumentCache(settings.document_cache_max_bytes)
+        
+        # Per-document search and preview work runs on its own threads, so a
+        # search over many documents doesn't hold up the Azure calls and text
+        # extraction sharing the default executor
+        self._search_pool = ThreadPoolExecutor(max_workers=settings.search_threads, thread_name_prefix="search")
+        
+        # SQLite postings of lowercase character bigrams and word tokens ->
+        # document ID, so text search only reads documents that can contain a
+        # query term and can skip scanning for terms indexed as whole tokens
+        self._db = sqlite3.connect(self.inverted_file, check_same_thread=False)
+        # Adds index their terms concurrently; each write transaction needs the connection to itself
+        self._db_lock = threading.Lock()
+        self._open_inverted_index()
+        
+        # Chunk texts and quantized chunk embeddings of embedded documents
+        self._vectors: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        for doc_id, doc_info in self.documents_index.items():
+            vectors_file = doc_info.get("vectors_file")
+            if vectors_file and os.path.exists(vectors_file):
+                try:
+                    with np.load(vectors_file) as data:
+                        self._vectors[doc_id] = (data["chunks"].tolist(), self._quantize_rows(data["embeddings"]))
+                except Exception as e:
+                    print(f"Error loading vectors for document {doc_id}: {e}")
+        
+        # All chunk embeddings stacked into one (N, d) matrix, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_doc_ids: List[str] = []
+        self._matrix_chunk_idx: List[int] = []
+    
+    @staticmethod
+    def _quantize_rows(embeddings: np.ndarray) -> np.ndarray:
+        """L2-normalize embeddings and scale them to int8, a quarter of the float32 size."""
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return np.round(embeddings / norms * QUANT_SCALE).astype(np.int8)
     
     def _load_documents_index(self) -> Dict[str, Any]:
-        """Load documents index from JSON file."""
+        """Load the documents index snapshot and replay the log of later changes."""
+        documents_index = {}
         if os.path.exists(self.documents_file):
             try:
-                with open(self.documents_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(self.documents_file, 'rb', buffering=FILE_BUFFER_SIZE) as f:
+                    documents_index = orjson.loads(f.read())
             except Exception as e:
                 print(f"Error loading documents index: {e}")
-                return {}
-        return {}
+        
+        if os.path.exists(self.documents_log_file):
+            with open(self.documents_log_file, 'rb', buffering=FILE_BUFFER_SIZE) as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # Only a write cut short by a crash can be malformed
+                        print(f"Skipping malformed documents log record: {line[:80]!r}")
+                        continue
+                    if record["op"] == "add":
+                        documents_index[record["id"]] = record["doc"]
+                    elif record["op"] == "del":
+                        documents_index.pop(record["id"], None)
+        
+        return documents_index
     
-    def _save_documents_index(self):
-        """Save documents index to JSON file."""
+    def _save_documents_index(self) -> bool:
+        """Save documents index to JSON file, atomically replacing the old snapshot; return whether it was saved."""
         try:
-            with open(self.documents_file, 'w', encoding='utf-8') as f:
-                json.dump(self.documents_index, f, ensure_ascii=False, indent=2, default=str)
+            tmp_file = self.documents_file + ".tmp"
+            with open(tmp_file, 'wb', buffering=FILE_BUFFER_SIZE) as f:
+                f.write(orjson.dumps(self.documents_index, default=str))
+                f.flush()
+                # The new snapshot must be on disk before it replaces the old one
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.documents_file)
+            self._snapshot_size = os.path.getsize(self.documents_file)
+            return True
         except Exception as e:
             print(f"Error saving documents index: {e}")
+            return False
+    
+    def _log_documents_change(self, record: Dict[str, Any]):
+        """Queue a documents index change for the log; changes close together are flushed as one write."""
+        self._pending_log.append(orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE))
+        self._schedule_log_flush(LOG_FLUSH_DELAY)
+    
+    def _schedule_log_flush(self, delay: float):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(delay, self._start_log_flush)
+    
+    def _start_log_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self.flush_documents_log())
+    
+    async def flush_documents_log(self):
+        """Write any queued documents index changes to the log now."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        # Flushes take the lock, so they write their records in order
+        async with self._lock:
+            records, self._pending_log = self._pending_log, []
+            if records and not await asyncio.to_thread(self._write_documents_log, records):
+                # Nothing else can queue records while the lock is held, so
+                # putting them back keeps the log in order
+                self._pending_log[:0] = records
+                self._schedule_log_flush(LOG_RETRY_DELAY)
+    
+    def _write_documents_log(self, records: List[bytes]) -> bool:
+        """Append records to the log, compacting it when it gets large; return whether they were written."""
+        # truncate() leaves the file position alone, so take the offset from the file's size
+        start = os.fstat(self._log.fileno()).st_size
+        data = memoryview(b"".join(records))
+        try:
+            # The log is unbuffered, so a write may take only part of the data
+            while data:
+                data = data[self._log.write(data):]
+            os.fsync(self._log.fileno())
+        except Exception as e:
+            print(f"Error writing documents log: {e}")
+            # Cut off whatever part of the batch got through, so the retry
+            # doesn't append whole records after a torn one
+            try:
+                self._log.truncate(start)
+                self._log.seek(start)
+            except OSError:
+                pass
+            return False
+        
+        if self._log.tell() > max(LOG_COMPACT_MIN_BYTES, LOG_COMPACT_RATIO * self._snapshot_size):
+            self._compact_documents_log()
+        return True
+    
+    def _compact_documents_log(self):
+        """Write a fresh snapshot of the documents index and empty the log."""
+        # The log still holds the only copy of its changes until the new
+        # snapshot is in place, so keep it if the save failed
+        if not self._save_documents_index():
+            return
+        # Replaying the log over the new snapshot is harmless, so a crash
+        # before the truncate loses nothing
+        self._log.truncate(0)
+        self._log.seek(0)
+        os.fsync(self._log.fileno())
+    
+    @staticmethod
+    def _bigrams(text: str) -> Set[str]:
+        """Return the distinct character bigrams of text."""
+        return {text[i:i + 2] for i in range(len(text) - 1)}
     
-    async def add_document(self, document_id: str, filename: str, content: str, metadata: Dict[str, Any]) -> bool:
-        """Add a document to the simple store."""
+    def _index_terms(self, document_id: str, content_lower: str):
+        """Add a document's bigrams and word tokens to the inverted index."""
+        tokens = set(_TOKEN_RE.findall(content_lower))
+        bigrams = self._bigrams(content_lower)
+        # A failure rolls the whole document back, leaving no partial postings
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO postings (bigram, doc_id) VALUES (?, ?)",
+                ((bigram, document_id) for bigram in bigrams)
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO terms (token, doc_id) VALUES (?, ?)",
+                ((token, document_id) for token in tokens)
+            )
+    
+    def _unindex_terms(self, document_id: str):
+        """Remove a document from the inverted index."""
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM postings WHERE doc_id = ?", (document_id,))
+            self._db.execute("DELETE FROM terms WHERE doc_id = ?", (document_id,))
+    
+    def _open_inverted_index(self):
+        """Create the inverted index tables and bring them in line with the documents index."""
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "bigram TEXT NOT NULL, doc_id TEXT NOT NULL, PRIMARY KEY (bigram, doc_id)"
+                ") WITHOUT ROWID"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS postings_doc_id ON postings (doc_id)")
+            # Older indexes stored unused per-document token counts; drop
+            # that table so every document's tokens are indexed again below
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(terms)")}
+            if "count" in columns:
+                self._db.execute("DROP TABLE terms")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS terms ("
+                "token TEXT NOT NULL, doc_id TEXT NOT NULL, PRIMARY KEY (token, doc_id)"
+                ") WITHOUT ROWID"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS terms_doc_id ON terms (doc_id)")
+        
+        with_bigrams = {row[0] for row in self._db.execute("SELECT DISTINCT doc_id FROM postings")}
+        with_terms = {row[0] for row in self._db.execute("SELECT DISTINCT doc_id FROM terms")}
+        for doc_id in (with_bigrams | with_terms) - self.documents_index.keys():
+            self._unindex_terms(doc_id)
+        indexed = with_bigrams & with_terms
+        for doc_id in self.documents_index.keys() - indexed:
+            markdown_file = self.documents_index[doc_id]["markdown_file"]
+            if not self._has_markdown_file(markdown_file):
+                continue
+            try:
+                with open(markdown_file, 'r', encoding='utf-8', buffering=FILE_BUFFER_SIZE) as f:
+                    self._index_terms(doc_id, f.read().lower())
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Warning: could not index {markdown_file}: {e}")
+    
+    def _match_candidates(
+        self, patterns: Set[str]
+    ) -> Tuple[Dict[str, Set[str]], Dict[str, Optional[Set[str]]]]:
+        """For each pattern, the documents that contain it as a whole word token,
+        and the documents that may contain it at all (None if any may)."""
+        certain: Dict[str, Set[str]] = {}
+        possible: Dict[str, Optional[Set[str]]] = {}
+        # The connection is shared with the indexing threads
+        with self._db_lock:
+            for pattern in patterns:
+                certain[pattern] = {
+                    row[0] for row in self._db.execute("SELECT doc_id FROM terms WHERE token = ?", (pattern,))
+                }
+                if len(pattern) < 2:
+                    possible[pattern] = None
+                    continue
+                
+                # Every bigram of the pattern must occur in the document
+                bigrams = list(self._bigrams(pattern))
+                rows = self._db.execute(
+                    f"SELECT doc_id FROM postings WHERE bigram IN ({','.join('?' * len(bigrams))}) "
+                    "GROUP BY doc_id HAVING COUNT(*) = ?",
+                    (*bigrams, len(bigrams))
+                )
+                possible[pattern] = {row[0] for row in rows}
+        return certain, possible
+    
+    def _has_markdown_file(self, markdown_file: str) -> bool:
+        """Whether a document's markdown file exists, without touching the disk for files in markdown_dir."""
+        # Entries written under another data directory (e.g. /app/data in a
+        # copied index) are checked on disk, as _known_files only covers ours
+        if os.path.dirname(markdown_file) != self.markdown_dir:
+            return os.path.exists(markdown_file)
+        return os.path.basename(markdown_file) in self._known_files
+    
+    @staticmethod
+    def _remove_files(*file_paths: Optional[str]):
+        """Remove the given files, skipping missing ones."""
+        for file_path in file_paths:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+    
+    async def add_document(
+        self,
+        document_id: str,
+        filename: str,
+        content: str,
+        metadata: Dict[str, Any],
+        chunks: Optional[List[str]] = None,
+        embeddings: Optional[List[np.ndarray]] = None
+    ) -> bool:
+        """Add a document to the simple store, with precomputed chunk embeddings if available."""
         try:
-            # Split content into chunks
-            chunks = self._split_text_into_chunks(content)
+            # Split content into chunks unless the caller already did
+            if chunks is None:
+                chunks = split_text_into_chunks(content)
             
             # Save as markdown file
             markdown_file = os.path.join(self.markdown_dir, f"{document_id}.md")
+            upload_time = datetime.now().isoformat()
+            content_length = len(content)
             
-            # Create markdown content with metadata
-            markdown_content = f"""# {filename}
+            # Create markdown content with metadata, built as a list of parts
+            # and joined once so large documents aren't copied per chunk
+            parts = [f"""# {filename}
 
 **文档ID**: {document_id}
-**上传时间**: {datetime.now().isoformat()}
-**文件大小**: {len(content)} 字符
+**上传时间**: {upload_time}
+**文件大小**: {content_length} 字符
 **分块数量**: {len(chunks)}
 
 ---
@@ -62,86 +491,250 @@ class SimpleDocumentStore:
 
 ## 文档分块
 
-"""
+"""]
             
             # Add chunks as sections
             for i, chunk in enumerate(chunks):
-                markdown_content += f"""### 分块 {i+1}
+                parts.append(f"""### 分块 {i+1}
 
 {chunk}
 
 ---
 
-"""
+""")
+            markdown_content = "".join(parts)
             
-            with open(markdown_file, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
+            vectors_file = None
+            try:
+                # Encoded once and written as bytes, through io_uring when enabled
+                await uring_writer.write_file(markdown_file, markdown_content.encode('utf-8'))
+                self._known_files.add(os.path.basename(markdown_file))
+                
+                # Save chunk embeddings next to their chunk text
+                quantized = None
+                if embeddings:
+                    vectors_file = os.path.join(self.vectors_dir, f"{document_id}.npz")
+                    stacked = np.vstack(embeddings)
+                    await asyncio.to_thread(np.savez, vectors_file, embeddings=stacked, chunks=np.array(chunks))
+                    quantized = self._quantize_rows(stacked)
+                
+                # Indexing a large document's terms takes a while, so do it before
+                # taking the lock; searches ignore it until it is in the index
+                await asyncio.to_thread(self._index_terms, document_id, markdown_content.lower())
+            except Exception:
+                # Nothing was published yet, so just drop what was written
+                await asyncio.to_thread(self._remove_files, markdown_file, vectors_file)
+                self._known_files.discard(os.path.basename(markdown_file))
+                raise
             
             # Update index
-            self.documents_index[document_id] = {
-                "filename": filename,
-                "markdown_file": markdown_file,
-                "upload_time": datetime.now().isoformat(),
-                "content_length": len(content),
-                "chunks_count": len(chunks),
-                "metadata": metadata
-            }
-            
-            self._save_documents_index()
+            async with self._lock:
+                self.documents_index[document_id] = {
+                    "filename": filename,
+                    "markdown_file": markdown_file,
+                    "vectors_file": vectors_file,
+                    "upload_time": upload_time,
+                    "content_length": content_length,
+                    "chunks_count": len(chunks),
+                    "metadata": metadata
+                }
+                if metadata.get("content_hash"):
+                    self._hash_index[metadata["content_hash"]] = document_id
+                if quantized is not None:
+                    self._vectors[document_id] = (list(chunks), quantized)
+                    self._matrix = None
+                self._doc_cache.pop(document_id)
+                
+                self._log_documents_change({"op": "add", "id": document_id, "doc": self.documents_index[document_id]})
             return True
             
         except Exception as e:
             print(f"Error adding document: {e}")
             return False
     
-    def _split_text_into_chunks(self, text: str) -> List[str]:
-        """Simple text chunking without embeddings."""
-        chunk_size = settings.chunk_size
-        chunk_overlap = settings.chunk_overlap
+    def _extract_keywords(self, query: str) -> List[str]:
+        """Extract keywords from query for better matching."""
+        # Split query, strip surrounding punctuation and filter out stop words and short words
+        words = (word.strip(_KEYWORD_STRIP_CHARS) for word in query.split())
+        return [
+            word_lower for word in words
+            if len(word) >= 2 and (word_lower := word.lower()) not in _STOP_WORDS
+        ]
+    
+    async def search_documents(
+        self,
+        query: str,
+        max_results: int = 5,
+        query_embedding: Optional[np.ndarray] = None,
+        similarity_threshold: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """Search by embedding similarity when possible, otherwise by text matching."""
+        if query_embedding is not None and self._vectors:
+            results = self._search_vectors(query_embedding, max_results, similarity_threshold)
+            if results:
+                # Documents stored without embeddings (older uploads, or ones whose
+                # embedding failed) can only be found by text; their scores aren't
+                # comparable, so alternate the two rankings
+                unembedded = self.documents_index.keys() - self._vectors.keys()
+                if unembedded:
+                    text_results = await self._search_text(query, max_results, unembedded)
+                    results = [
+                        result for pair in zip_longest(results, text_results)
+                        for result in pair if result is not None
+                    ][:max_results]
+                return results
         
-        if len(text) <= chunk_size:
-            return [text]
+        return await self._search_text(query, max_results)
+    
+    def _build_matrix(self, dims: int):
+        """Stack the chunk embeddings of the given width so a search is a single matmul."""
+        blocks = []
+        self._matrix_doc_ids = []
+        self._matrix_chunk_idx = []
+        for doc_id, (chunks, embeddings) in self._vectors.items():
+            if embeddings.shape[1] != dims:
+                continue
+            blocks.append(embeddings)
+            self._matrix_doc_ids.extend([doc_id] * len(chunks))
+            self._matrix_chunk_idx.extend(range(len(chunks)))
         
-        chunks = []
-        start = 0
+        if blocks:
+            self._matrix = np.ascontiguousarray(np.vstack(blocks))
+        else:
+            self._matrix = np.empty((0, dims), dtype=np.int8)
+    
+    def _search_vectors(
+        self, query_embedding: np.ndarray, max_results: int, similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """Rank documents by the cosine similarity of their best-matching chunks."""
+        norm = np.linalg.norm(query_embedding)
+        if not norm:
+            return []
+        query_vec = (query_embedding / norm).astype(np.float32)
         
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Find the last period within the chunk
-                last_period = text.rfind(".", start, end)
-                if last_period != -1 and last_period > start + chunk_size // 2:
-                    end = last_period + 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - chunk_overlap
-            if start >= len(text):
-                break
+        if self._matrix is None or self._matrix.shape[1] != query_vec.shape[0]:
+            self._build_matrix(query_vec.shape[0])
+        
+        # Widen the int8 matrix block by block so BLAS does the work without
+        # materializing a full float32 copy
+        scores = np.empty(len(self._matrix), dtype=np.float32)
+        for start in range(0, len(self._matrix), SCORE_BLOCK_ROWS):
+            block = self._matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            np.matmul(block, query_vec, out=scores[start:start + SCORE_BLOCK_ROWS])
+        scores /= QUANT_SCALE
+        candidates = np.flatnonzero(scores >= similarity_threshold)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        
+        # Walk chunks best-first: the first max_results distinct documents win,
+        # and each keeps its top 3 chunks
+        top_chunks: Dict[str, List[int]] = {}
+        for row in candidates:
+            doc_id = self._matrix_doc_ids[row]
+            doc_chunks = top_chunks.get(doc_id)
+            if doc_chunks is None:
+                if len(top_chunks) >= max_results:
+                    if all(len(c) >= 3 for c in top_chunks.values()):
+                        break
+                    continue
+                doc_chunks = top_chunks[doc_id] = []
+            if len(doc_chunks) < 3:
+                doc_chunks.append(row)
         
-        return chunks
+        results = []
+        for doc_id, rows in top_chunks.items():
+            doc_info = self.documents_index.get(doc_id)
+            if doc_info is None:
+                continue
+            chunks = self._vectors[doc_id][0]
+            results.append({
+                "content": '\n\n'.join(chunks[self._matrix_chunk_idx[row]] for row in rows),  # Limit to top 3 chunks
+                "metadata": {
+                    "document_id": doc_id,
+                    "source": doc_info["filename"],
+                    "upload_time": doc_info["upload_time"]
+                },
+                "score": float(scores[rows[0]])
+            })
+        
+        return results
     
-    def _extract_keywords(self, query: str) -> List[str]:
-        """Extract keywords from query for better matching."""
-        # Common stop words to ignore
-        stop_words = {'的', '是', '在', '有', '和', '与', '或', '但', '然后', '如何', '什么', '怎么', '怎样', 
-                     'how', 'to', 'what', 'is', 'are', 'the', 'a', 'an', 'and', 'or', 'but', 'then'}
+    def _in_search_pool(self, func, *args) -> "asyncio.Future":
+        """Run a function on the search threads."""
+        return asyncio.get_running_loop().run_in_executor(self._search_pool, func, *args)
+    
+    def _load_doc(self, doc_id: str, markdown_file: str) -> Optional[Tuple[str, str, List[int]]]:
+        """Return a document's content, lowercased content and line offsets, reading the file once."""
+        cached = self._doc_cache.get(doc_id)
+        if cached is None:
+            if not self._has_markdown_file(markdown_file):
+                return None
+            with open(markdown_file, 'r', encoding='utf-8', buffering=FILE_BUFFER_SIZE) as f:
+                cached = self._cache_doc(doc_id, f.read())
+        
+        return cached
+    
+    def _cache_doc(self, doc_id: str, content: str) -> Tuple[str, str, List[int]]:
+        """Cache a document's content with its lowercase copy and line start offsets."""
+        line_starts = [0]
+        line_starts.extend(m.end() for m in _NEWLINE_RE.finditer(content))
+        cached = (content, content.lower(), line_starts)
+        # A search may finish reading a document just after it was deleted
+        if doc_id in self.documents_index:
+            self._doc_cache.put(doc_id, cached)
+        return cached
+    
+    async def _prefetch_docs(self, docs: List[Tuple[str, Dict[str, Any]]]):
+        """Read documents missing from the cache in io_uring batches, up to the cache's budget."""
+        # Prefetching past the budget would only evict documents read earlier
+        # in this search; a cached document holds at least twice its file size
+        stale = []
+        budget = self._doc_cache.max_bytes
+        for doc_id, doc_info in docs:
+            if doc_id in self._doc_cache or not self._has_markdown_file(doc_info["markdown_file"]):
+                continue
+            budget -= 2 * os.path.getsize(doc_info["markdown_file"])
+            if budget < 0:
+                break
+            stale.append((doc_id, doc_info["markdown_file"]))
         
-        # Split query and filter out stop words and short words
-        keywords = []
-        for word in query.split():
-            word = word.strip('.,!?;:()[]{}"\'-')
-            if len(word) >= 2 and word.lower() not in stop_words:
-                keywords.append(word.lower())
+        # Read and decode a batch per search worker at a time, stopping once
+        # the decoded documents fill the cache
+        budget = self._doc_cache.max_bytes
+        batch_size = uring_writer.MAX_BATCH
+        wave_size = batch_size * max(1, settings.search_threads)
+        for wave_start in range(0, len(stale), wave_size):
+            wave = stale[wave_start:wave_start + wave_size]
+            sizes = await asyncio.gather(*(
+                self._in_search_pool(self._prefetch_batch, wave[i:i + batch_size])
+                for i in range(0, len(wave), batch_size)
+            ))
+            budget -= sum(sizes)
+            if budget <= 0:
+                break
+    
+    def _prefetch_batch(self, stale: List[Tuple[str, str]]) -> int:
+        """Read one batch of documents with a single io_uring submission and cache them; return their cached size."""
+        contents = uring_writer.read_files([markdown_file for _, markdown_file in stale])
+        if contents is None:
+            return 0
         
-        return keywords
+        cached_size = 0
+        for (doc_id, _), data in zip(stale, contents):
+            try:
+                # Decode like open() in text mode, including newline translation
+                content = data.decode('utf-8')
+                if '\r' in content:
+                    content = content.replace('\r\n', '\n').replace('\r', '\n')
+                cached_size += _DocumentCache.entry_size(self._cache_doc(doc_id, content))
+            except UnicodeDecodeError:
+                # Left for _load_doc to read and report
+                continue
+        return cached_size
     
-    async def search_documents(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
-        """Simple text search without vector similarity."""
+    async def _search_text(
+        self, query: str, max_results: int = 5, doc_ids: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Simple text search without vector similarity, optionally limited to the given documents."""
         results = []
         query_lower = query.lower()
         
@@ -149,111 +742,233 @@ class SimpleDocumentStore:
         query_keywords = self._extract_keywords(query_lower)
         print(f"🔍 Search query: '{query}' | Keywords: {query_keywords}")
         
-        for doc_id, doc_info in self.documents_index.items():
+        # Match the phrase and every keyword in a single pass over each matching document
+        keyword_counts = Counter(query_keywords)
+        patterns = set(keyword_counts)
+        if query_lower:
+            patterns.add(query_lower)
+        
+        # Only read documents that may contain the phrase or a keyword
+        certain, possible = await self._in_search_pool(self._match_candidates, patterns)
+        text_query = _TextQuery(
+            query_lower=query_lower,
+            keywords=query_keywords,
+            keyword_counts=keyword_counts,
+            patterns=patterns,
+            automaton=_build_automaton(tuple(sorted(patterns))) if patterns else None,
+            certain=certain,
+            possible=possible,
+            scan_order=_scan_order(patterns),
+            matcher=_build_matcher(tuple(sorted(patterns))) if patterns and native.is_enabled() else None
+        )
+        if text_query.phrase_everywhere or any(doc_ids is None for doc_ids in possible.values()):
+            candidates = None
+        else:
+            candidates = set().union(*possible.values())
+        docs = [
+            (doc_id, doc_info) for doc_id, doc_info in self.documents_index.items()
+            if (candidates is None or doc_id in candidates) and (doc_ids is None or doc_id in doc_ids)
+        ]
+        
+        # With io_uring, read uncached candidates in a few batched submissions
+        if uring_writer.is_enabled():
             try:
-                markdown_file = doc_info["markdown_file"]
-                if not os.path.exists(markdown_file):
-                    continue
-                
-                with open(markdown_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Multiple matching strategies
-                content_lower = content.lower()
-                score = 0
-                
-                # 1. Exact phrase matching
-                if query_lower in content_lower:
-                    score += 10
-                
-                # 2. Keyword matching
-                keyword_matches = 0
-                for keyword in query_keywords:
-                    if keyword in content_lower:
-                        keyword_matches += 1
-                        score += 3
-                
-                # Only include if we have matches
-                if score > 0:
-                    # Find relevant chunks
-                    lines = content.split('\n')
-                    relevant_chunks = []
-                    
-                    # Look for lines containing query keywords
-                    for i, line in enumerate(lines):
-                        line_lower = line.lower()
-                        line_matches = False
-                        
-                        # Check for exact phrase or keyword matches
-                        if query_lower in line_lower:
-                            line_matches = True
-                        else:
-                            # Check if line contains multiple keywords
-                            matches = sum(1 for keyword in query_keywords if keyword in line_lower)
-                            if matches >= 2 or (matches >= 1 and len(query_keywords) <= 2):
-                                line_matches = True
-                        
-                        if line_matches:
-                            # Get context around the match
-                            start_idx = max(0, i - 3)
-                            end_idx = min(len(lines), i + 4)
-                            context = '\n'.join(lines[start_idx:end_idx]).strip()
-                            if context and len(context) > 10:  # Only meaningful context
-                                relevant_chunks.append(context[:400] + "..." if len(context) > 400 else context)
-                    
-                    # If no specific chunks found, use broader content
-                    if not relevant_chunks:
-                        # Get content sections that contain keywords
-                        sections = content.split('\n\n')
-                        for section in sections:
-                            section_lower = section.lower()
-                            matches = sum(1 for keyword in query_keywords if keyword in section_lower)
-                            if matches >= 1:
-                                relevant_chunks.append(section[:400] + "..." if len(section) > 400 else section)
-                    
-                    print(f"📄 Document {doc_info['filename']}: score={score}, chunks={len(relevant_chunks)}")
-                    
-                    if relevant_chunks:  # Only add if we found relevant content
-                        results.append({
-                            "content": '\n\n'.join(relevant_chunks[:3]),  # Limit to top 3 chunks
-                            "metadata": {
-                                "document_id": doc_id,
-                                "source": doc_info["filename"],
-                                "upload_time": doc_info["upload_time"]
-                            },
-                            "score": score
-                        })
-                    
+                await self._prefetch_docs(docs)
             except Exception as e:
-                print(f"Error searching document {doc_id}: {e}")
+                print(f"Warning: io_uring prefetch failed: {e}")
+        
+        # Load and score all candidate documents concurrently off the event loop
+        scores = await asyncio.gather(
+            *(self._in_search_pool(self._score_document, doc_id, doc_info, text_query) for doc_id, doc_info in docs),
+            return_exceptions=True
+        )
+        
+        ranked = []
+        for position, ((doc_id, doc_info), scored) in enumerate(zip(docs, scores)):
+            if isinstance(scored, Exception):
+                print(f"Error searching document {doc_id}: {scored}")
+            elif scored is not None:
+                score, loaded = scored
+                ranked.append((score, position, doc_id, doc_info, loaded))
+        
+        # Sort by score, then extract chunks best-first only until max_results
+        # documents have them; documents without relevant chunks are skipped
+        ranked.sort(key=lambda r: (-r[0], r[1]))
+        next_rank = 0
+        while len(results) < max_results and next_rank < len(ranked):
+            batch = ranked[next_rank:next_rank + max_results - len(results)]
+            next_rank += len(batch)
+            matches = await asyncio.gather(
+                *(
+                    self._in_search_pool(self._extract_chunks, doc_id, doc_info, score, loaded, text_query)
+                    for score, _, doc_id, doc_info, loaded in batch
+                ),
+                return_exceptions=True
+            )
+            for (_, _, doc_id, _, _), match in zip(batch, matches):
+                if isinstance(match, Exception):
+                    print(f"Error searching document {doc_id}: {match}")
+                elif match is not None:
+                    results.append(match)
+        
+        return results
+    
+    def _score_document(
+        self, doc_id: str, doc_info: Dict[str, Any], q: "_TextQuery"
+    ) -> Optional[Tuple[int, Tuple[str, str, List[int]]]]:
+        """Score one document against a text query; return the score and loaded document if it matches."""
+        loaded = self._load_doc(doc_id, doc_info["markdown_file"])
+        if loaded is None:
+            return None
+        content_lower = loaded[1]
+        
+        # Patterns indexed as whole tokens of the document are known to
+        # be present; only the others need a substring search, and not even
+        # that when a shorter pattern they contain is already known missing
+        found = set()
+        missing = set()
+        unsearched = []
+        for pattern, subs in q.scan_order:
+            if doc_id in q.certain[pattern]:
+                found.add(pattern)
+            elif (
+                (q.possible[pattern] is not None and doc_id not in q.possible[pattern])
+                or any(sub in missing for sub in subs)
+            ):
+                missing.add(pattern)
+            elif q.matcher is not None:
+                # Searched natively below, without holding the GIL
+                unsearched.append(pattern)
+            elif pattern in content_lower:
+                found.add(pattern)
+            else:
+                missing.add(pattern)
+        if unsearched:
+            found |= q.matcher.find(content_lower, unsearched)
+        
+        # Multiple matching strategies
+        score = 0
+        
+        # 1. Exact phrase matching
+        if q.phrase_everywhere or q.query_lower in found:
+            score += 10
+        
+        # 2. Keyword matching
+        score += 3 * sum(q.keyword_counts[keyword] for keyword in found if keyword in q.keyword_counts)
+        
+        # Only include if we have matches
+        if score <= 0:
+            return None
+        return score, loaded
+    
+    def _extract_chunks(
+        self,
+        doc_id: str,
+        doc_info: Dict[str, Any],
+        score: int,
+        loaded: Tuple[str, str, List[int]],
+        q: "_TextQuery"
+    ) -> Optional[Dict[str, Any]]:
+        """Extract the relevant chunks of a matching document into a search result."""
+        content, content_lower, line_starts = loaded
+        num_lines = len(line_starts)
+        
+        # Collect the patterns on each line, by the line they end on, and
+        # where each keyword occurrence starts
+        line_hits: Dict[int, Set[str]] = {}
+        keyword_starts: List[int] = []
+        if q.automaton is not None:
+            line_no = 0
+            last_end = 0
+            for end_idx, pattern in q.automaton.iter(content_lower):
+                line_no += content_lower.count('\n', last_end, end_idx)
+                last_end = end_idx
+                line_hits.setdefault(line_no, set()).add(pattern)
+                if pattern in q.keyword_counts:
+                    keyword_starts.append(end_idx - len(pattern) + 1)
+        
+        # Find relevant chunks
+        relevant_chunks = []
+        
+        # Look for lines containing query keywords
+        candidate_lines = range(num_lines) if q.phrase_everywhere else sorted(line_hits)
+        covered_until = 0
+        for i in candidate_lines:
+            # A match inside the previous chunk's window would repeat its context
+            if i < covered_until:
                 continue
+            hits = line_hits.get(i, ())
+            
+            # Check for exact phrase or keyword matches
+            if q.phrase_everywhere or (q.phrase_fits_line and q.query_lower in hits):
+                line_matches = True
+            else:
+                # Check if line contains multiple keywords
+                matches = sum(q.keyword_counts[keyword] for keyword in hits if keyword in q.keyword_counts)
+                line_matches = matches >= 2 or (matches >= 1 and q.few_keywords)
+            
+            if line_matches:
+                # Get context around the match
+                start_idx = max(0, i - 3)
+                end_idx = min(num_lines, i + 4)
+                end_offset = line_starts[end_idx] - 1 if end_idx < num_lines else len(content)
+                context = content[line_starts[start_idx]:end_offset].strip()
+                if context and len(context) > 10:  # Only meaningful context
+                    relevant_chunks.append(context[:400] + "..." if len(context) > 400 else context)
+                    covered_until = end_idx
+        
+        # If no specific chunks found, use broader content
+        if not relevant_chunks:
+            # Get content sections that contain keywords
+            if len(content_lower) == len(content):
+                # Offsets in both copies line up, so find the paragraphs
+                # holding a keyword occurrence instead of rescanning them
+                section_starts = [0]
+                section_starts.extend(m.end() for m in _PARAGRAPH_RE.finditer(content))
+                for k in sorted({bisect_right(section_starts, start) - 1 for start in keyword_starts}):
+                    section_end = section_starts[k + 1] - 2 if k + 1 < len(section_starts) else len(content)
+                    section = content[section_starts[k]:section_end]
+                    relevant_chunks.append(section[:400] + "..." if len(section) > 400 else section)
+            else:
+                for section in content.split('\n\n'):
+                    section_lower = section.lower()
+                    matches = sum(1 for keyword in q.keywords if keyword in section_lower)
+                    if matches >= 1:
+                        relevant_chunks.append(section[:400] + "..." if len(section) > 400 else section)
+        
+        print(f"📄 Document {doc_info['filename']}: score={score}, chunks={len(relevant_chunks)}")
         
-        # Sort by score and limit results
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:max_results]
+        if not relevant_chunks:  # Only add if we found relevant content
+            return None
+        
+        return {
+            "content": '\n\n'.join(relevant_chunks[:3]),  # Limit to top 3 chunks
+            "metadata": {
+                "document_id": doc_id,
+                "source": doc_info["filename"],
+                "upload_time": doc_info["upload_time"]
+            },
+            "score": score
+        }
     
     async def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get all documents from the simple store."""
         documents = []
+        docs = list(self.documents_index.items())
         
-        for doc_id, doc_info in self.documents_index.items():
+        # Read the previews concurrently off the event loop
+        previews = await asyncio.gather(
+            *(self._in_search_pool(self._read_content_preview, doc_info) for _, doc_info in docs),
+            return_exceptions=True
+        )
+        
+        for (doc_id, doc_info), preview in zip(docs, previews):
             try:
-                # Read content preview from markdown file
-                markdown_file = doc_info["markdown_file"]
-                content_preview = ""
-                
-                if os.path.exists(markdown_file):
-                    with open(markdown_file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        # Extract original content (after first ---)
-                        parts = content.split('---', 2)
-                        if len(parts) > 2:
-                            original_content = parts[1].strip()
-                            content_preview = original_content[:500] + "..." if len(original_content) > 500 else original_content
-                
+                if isinstance(preview, Exception):
+                    raise preview
                 documents.append({
                     "id": doc_id,
-                    "content": content_preview,
+                    "content": preview,
                     "metadata": doc_info
                 })
                 
@@ -263,23 +978,63 @@ class SimpleDocumentStore:
         
         return documents
     
+    def _read_content_preview(self, doc_info: Dict[str, Any]) -> str:
+        """Read a content preview from a document's markdown file."""
+        markdown_file = doc_info["markdown_file"]
+        content_preview = ""
+        
+        if self._has_markdown_file(markdown_file) and os.path.getsize(markdown_file) > 0:
+            # Map the file and decode only the original content, which sits
+            # between the first two --- separators, not the chunks after it
+            with open(markdown_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = mm.find(b'---')
+                end = mm.find(b'---', start + 3) if start != -1 else -1
+                if end != -1:
+                    original_content = mm[start + 3:end].decode('utf-8')
+                    if '\r' in original_content:
+                        original_content = original_content.replace('\r\n', '\n').replace('\r', '\n')
+                    original_content = original_content.strip()
+                    content_preview = original_content[:500] + "..." if len(original_content) > 500 else original_content
+        
+        return content_preview
+    
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Find a stored document with identical file content."""
+        doc_id = self._hash_index.get(content_hash)
+        if doc_id is None or doc_id not in self.documents_index:
+            return None
+        
+        doc_info = self.documents_index[doc_id]
+        return {
+            "id": doc_id,
+            "content": self._read_content_preview(doc_info),
+            "metadata": doc_info
+        }
+    
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document from the simple store."""
         try:
-            if document_id in self.documents_index:
-                doc_info = self.documents_index[document_id]
-                
-                # Delete markdown file
-                markdown_file = doc_info["markdown_file"]
-                if os.path.exists(markdown_file):
-                    os.remove(markdown_file)
-                
-                # Remove from index
-                del self.documents_index[document_id]
-                self._save_documents_index()
-                
-                return True
-            return False
+            async with self._lock:
+                if document_id in self.documents_index:
+                    doc_info = self.documents_index[document_id]
+                    
+                    # Delete markdown and vectors files
+                    await asyncio.to_thread(self._remove_files, doc_info["markdown_file"], doc_info.get("vectors_file"))
+                    
+                    # Remove from index
+                    content_hash = doc_info.get("metadata", {}).get("content_hash")
+                    if content_hash and self._hash_index.get(content_hash) == document_id:
+                        del self._hash_index[content_hash]
+                    del self.documents_index[document_id]
+                    if self._vectors.pop(document_id, None) is not None:
+                        self._matrix = None
+                    self._doc_cache.pop(document_id)
+                    self._known_files.discard(os.path.basename(doc_info["markdown_file"]))
+                    await asyncio.to_thread(self._unindex_terms, document_id)
+                    self._log_documents_change({"op": "del", "id": document_id})
+                    
+                    return True
+                return False
             
         except Exception as e:
             print(f"Error deleting document {document_id}: {e}")
@@ -0,0 +1,184 @@
+import os
+import sys
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import aiofiles
+
+from ..config import settings
+
+try:
+    import liburing
+except ImportError:  # Optional, Linux only
+    liburing = None
+
+
+# Ring geometry and the size of each write submitted to it
+RING_ENTRIES = 256
+MAX_BATCH = 32
+SQE_WRITE_SIZE = 256 * 1024
+
+# Fewer reads than this are done with plain syscalls, which are faster for tiny batches
+MIN_READ_BATCH = 4
+
+
+class IoUringBatchEngine:
+    """Read and write files through a shared io_uring, submitting the I/O as batches of SQEs."""
+
+    def __init__(self, entries: int = RING_ENTRIES, max_batch: int = MAX_BATCH):
+        self.max_batch = min(max_batch, entries)
+        self._ring = liburing.Ring()
+        liburing.io_uring_queue_init(entries, self._ring)
+        self._cqe = liburing.Cqe()
+        # A ring must not be driven from several threads at once
+        self._lock = threading.Lock()
+
+    def _submit(self, ops: list) -> List[int]:
+        """Submit (prep function, fd, buffer, offset) ops as one batch and return their results in order.
+
+        Must be called with the lock held.
+        """
+        for index, (prep, fd, buf, offset) in enumerate(ops):
+            sqe = liburing.io_uring_get_sqe(self._ring)
+            prep(sqe, fd, buf, offset)
+            liburing.io_uring_sqe_set_data64(sqe, index)
+
+        liburing.io_uring_submit(self._ring)
+        liburing.io_uring_wait_cqe_nr(self._ring, self._cqe, len(ops))
+        # Completions can arrive out of order, so place them by their user data
+        results = [0] * len(ops)
+        for j in range(len(ops)):
+            results[self._cqe[j].user_data] = self._cqe[j].res
+        liburing.io_uring_cq_advance(self._ring, len(ops))
+        return results
+
+    def pwrite(self, fd: int, data: bytes, offset: int = 0) -> int:
+        """Write data to fd at offset and return the number of bytes written."""
+        pieces = [
+            (offset + pos, bytes(data[pos:pos + SQE_WRITE_SIZE]))
+            for pos in range(0, len(data), SQE_WRITE_SIZE)
+        ]
+
+        with self._lock:
+            for i in range(0, len(pieces), self.max_batch):
+                batch = pieces[i:i + self.max_batch]
+                results = self._submit([
+                    (liburing.io_uring_prep_write, fd, piece, piece_offset)
+                    for piece_offset, piece in batch
+                ])
+
+                for (piece_offset, piece), result in zip(batch, results):
+                    liburing.trap_error(result)
+                    if result != len(piece):
+                        raise OSError(f"Short write at offset {piece_offset}: {result} of {len(piece)} bytes")
+
+        return len(data)
+
+    def read_files(self, file_paths: List[str]) -> List[bytes]:
+        """Read whole files, issuing up to max_batch reads per submission."""
+        contents = []
+        for i in range(0, len(file_paths), self.max_batch):
+            contents.extend(self._read_batch(file_paths[i:i + self.max_batch]))
+        return contents
+
+    def _read_batch(self, file_paths: List[str]) -> List[bytes]:
+        """Read up to max_batch whole files with a single submission."""
+        fds = []
+        try:
+            for file_path in file_paths:
+                fds.append(os.open(file_path, os.O_RDONLY))
+            buffers = [bytearray(os.fstat(fd).st_size) for fd in fds]
+
+            with self._lock:
+                results = self._submit([
+                    (liburing.io_uring_prep_read, fd, buf, 0)
+                    for fd, buf in zip(fds, buffers)
+                ])
+
+            contents = []
+            for fd, buf, result in zip(fds, buffers, results):
+                liburing.trap_error(result)
+                data = bytes(buf[:result])
+                # Finish a short read with plain preads
+                while len(data) < len(buf):
+                    more = os.pread(fd, len(buf) - len(data), len(data))
+                    if not more:
+                        break
+                    data += more
+                contents.append(data)
+            return contents
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def close(self):
+        """Tear down the ring."""
+        liburing.io_uring_queue_exit(self._ring)
+
+
+class _UringFile:
+    """Minimal async file handle that appends through the io_uring engine."""
+
+    def __init__(self, engine: IoUringBatchEngine, fd: int):
+        self._engine = engine
+        self._fd = fd
+        self._offset = 0
+
+    async def write(self, data: bytes) -> int:
+        written = await asyncio.to_thread(self._engine.pwrite, self._fd, data, self._offset)
+        self._offset += written
+        return written
+
+
+_engine: Optional[IoUringBatchEngine] = None
+_engine_failed = False
+
+
+def is_enabled() -> bool:
+    """Whether io_uring writes are configured and supported on this platform."""
+    return settings.use_io_uring and sys.platform == "linux" and liburing is not None
+
+
+def _get_engine() -> Optional[IoUringBatchEngine]:
+    """Create the shared engine on first use, or return None to fall back to aiofiles."""
+    global _engine, _engine_failed
+    if _engine is None and not _engine_failed and is_enabled():
+        try:
+            _engine = IoUringBatchEngine()
+        except Exception as e:
+            print(f"Warning: io_uring initialization failed, using aiofiles: {e}")
+            _engine_failed = True
+    return _engine
+
+
+@asynccontextmanager
+async def open_for_write(file_path: str):
+    """Open a file for writing with io_uring when enabled, otherwise with aiofiles."""
+    engine = _get_engine()
+    if engine is None:
+        async with aiofiles.open(file_path, "wb") as f:
+            yield f
+        return
+
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        yield _UringFile(engine, fd)
+    finally:
+        os.close(fd)
+
+
+async def write_file(file_path: str, data: bytes):
+    """Write data to a new file."""
+    async with open_for_write(file_path) as f:
+        await f.write(data)
+
+
+def read_files(file_paths: List[str]) -> Optional[List[bytes]]:
+    """Read whole files in io_uring batches, or return None if io_uring is off or the batch is too small."""
+    if len(file_paths) < MIN_READ_BATCH:
+        return None
+    engine = _get_engine()
+    if engine is None:
+        return None
+    return engine.read_files(file_paths)
@@ -0,0 +1,57 @@
+//! Native substring search for Mini-RAG's text search inner loop.
+//!
+//! The function uses a plain C ABI and is loaded with ctypes by
+//! `backend/app/services/native.py`, so building needs nothing but cargo:
+//!
+//!     cargo build --release --manifest-path mini_rag_native/Cargo.toml
+//!
+//! Text and patterns are passed in as UTF-8.
+
+use std::slice;
+use std::str;
+
+/// Flag which of the wanted patterns occur in `haystack`.
+///
+/// For each `i` with `wanted[i]` non-zero, sets `found[i]` to 1 if
+/// `patterns[i]` is a substring of the haystack and to 0 otherwise.
+/// Returns the number of patterns found.
+///
+/// # Safety
+///
+/// `haystack` must point to `len` bytes of valid UTF-8; `patterns` and
+/// `pattern_lens` to `num_patterns` UTF-8 strings and their byte lengths;
+/// `wanted` and `found` to `num_patterns` bytes each.
+#[no_mangle]
+pub unsafe extern "C" fn mrn_find_patterns(
+    haystack: *const u8,
+    len: usize,
+    patterns: *const *const u8,
+    pattern_lens: *const usize,
+    num_patterns: usize,
+    wanted: *const u8,
+    found: *mut u8,
+) -> usize {
+    let haystack = if len == 0 {
+        ""
+    } else {
+        str::from_utf8_unchecked(slice::from_raw_parts(haystack, len))
+    };
+
+    let mut num_found = 0;
+    for i in 0..num_patterns {
+        if *wanted.add(i) == 0 {
+            continue;
+        }
+        let pattern_len = *pattern_lens.add(i);
+        let pattern = if pattern_len == 0 {
+            ""
+        } else {
+            str::from_utf8_unchecked(slice::from_raw_parts(*patterns.add(i), pattern_len))
+        };
+        // std's substring search uses a SIMD prefilter for short patterns
+        let hit = haystack.contains(pattern);
+        *found.add(i) = hit as u8;
+        num_found += hit as usize;
+    }
+    num_found
+}
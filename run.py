@@ -9,19 +9,36 @@ import os
 # Add the backend directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
-from backend.app.main import app
 from backend.app.config import settings
 
+# Passed as an import string, which uvicorn needs for reload
+APP = "backend.app.main:app"
+
 if __name__ == "__main__":
     print("🚀 Starting Mini-RAG Application...")
     print(f"📍 Server will run on: http://{settings.app_host}:{settings.app_port}")
     print(f"📚 API Documentation: http://{settings.app_host}:{settings.app_port}/docs")
     print(f"🔧 Debug mode: {settings.debug}")
     
-    uvicorn.run(
-        app,
-        host=settings.app_host,
-        port=settings.app_port,
-        reload=settings.debug,
-        log_level="info"
-    )
\ No newline at end of file
+    if settings.debug:
+        uvicorn.run(
+            APP,
+            host=settings.app_host,
+            port=settings.app_port,
+            reload=True,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            APP,
+            host=settings.app_host,
+            port=settings.app_port,
+            # A single process: the document store keeps its index in memory and
+            # appends to and compacts documents.jsonl, so several workers would
+            # truncate each other's records and lose documents on restart
+            workers=1,
+            # uvloop is not available on Windows
+            loop="auto" if sys.platform == "win32" else "uvloop",
+            http="httptools",
+            log_level="info"
+        )